@@ -1,23 +1,64 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import argparse
+import contextlib
+import functools
 import gzip
 import hashlib
+import io
 import json
+import mmap
 import os
 import re
 import shutil
+import stat
 import subprocess
 import tarfile
 import tempfile
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Any, Dict, List, Optional, Set, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 try:
     import yaml  # pip install pyyaml
 except Exception:
     yaml = None
 
+try:
+    import blake3  # pip install blake3，仅 --digest-algo=blake3 时需要
+except Exception:
+    blake3 = None
+
+try:
+    import docker as docker_sdk  # pip install docker，--image-tool=docker 时复用一个 daemon 连接
+except Exception:
+    docker_sdk = None
+
+try:
+    import zstandard  # pip install zstandard，--compression=zstd 且没有 zstd 命令时使用
+except Exception:
+    zstandard = None
+
+if yaml is not None:
+    try:
+        # libyaml 加速的 C loader，解析大 chart 渲染结果快 5~10 倍
+        from yaml import CSafeLoader as _SafeLoader
+    except ImportError:
+        _SafeLoader = yaml.SafeLoader
+
+
+_SAFE_FILENAME_RE = re.compile(r"[^A-Za-z0-9._+-]+")
+_IMAGE_LINE_RE = re.compile(r"^-?\s*image:\s*([^\s#]+)", re.IGNORECASE)
+# 镜像引用两侧可能带的引号
+_QUOTES = "\"'"
+# 大文件拷贝/压缩的缓冲区，默认 64 KiB 时 Python 逐块调用开销占大头
+COPY_BUFSIZE = 4 * 1024 * 1024
+
+# 各压缩方式下 charts / images 的文件名；kcctl 只认 gzip 的 charts.tgz、images.tar.gz
+ARTIFACT_NAMES = {
+    "gzip": ("charts.tgz", "images.tar.gz"),
+    "zstd": ("charts.tar.zst", "images.tar.zst"),
+}
+
 
 def run(cmd: List[str], capture: bool = False) -> str:
     if capture:
@@ -27,34 +68,340 @@ def run(cmd: List[str], capture: bool = False) -> str:
     return ""
 
 
-def md5sum(path: str) -> str:
-    h = hashlib.md5()
+# kcctl 下载资源时按 md5 校验 manifest.json 里的 digest，其他算法只适合不经 kcctl 校验的场景
+DIGEST_ALGOS = ("md5", "sha256", "blake3")
+
+
+def new_hasher(algo: str) -> Any:
+    if algo == "blake3":
+        if blake3 is None:
+            raise RuntimeError("--digest-algo=blake3 requires the blake3 package: pip install blake3")
+        return blake3.blake3()
+    if algo in DIGEST_ALGOS:
+        return hashlib.new(algo)
+    raise RuntimeError(f"unsupported digest algo: {algo}")
+
+
+# 超过这个大小的文件 mmap 后整体喂给 hasher，省掉逐块分配 bytes 的开销
+MMAP_DIGEST_THRESHOLD = 10 * 1024 * 1024
+
+
+def file_digest(path: str, algo: str = "md5") -> str:
+    h = new_hasher(algo)
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+        if os.fstat(f.fileno()).st_size >= MMAP_DIGEST_THRESHOLD:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mm, "madvise"):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    h.update(mm)
+                return h.hexdigest()
+            except (OSError, ValueError):
+                # mmap 不可用时回退到分块读
+                h = new_hasher(algo)
+        for chunk in iter(lambda: f.read(8 * 1024 * 1024), b""):
             h.update(chunk)
     return h.hexdigest()
 
 
 def safe_filename(s: str) -> str:
-    return re.sub(r"[^A-Za-z0-9._+-]+", "_", s)
+    return _SAFE_FILENAME_RE.sub("_", s)
 
 
-def tar_dir_as_tgz(src_dir: str, dst_tgz: str) -> None:
+def tar_dir_external(src_dir: str, dst: str, compression: str = "gzip") -> bool:
     """
-    把目录打成 .tgz（tar.gz），归档内包含目录名本身（basename）。
+    用系统 tar 打包、pigz / zstd 多核压缩，归档顶层为 src_dir 的 basename。
+    tar 或多核压缩命令不存在时返回 False，由调用方回退到 tarfile 流式写入 compress_writer。
+    """
+    tar, compressor = shutil.which("tar"), parallel_compress_cmd(compression)
+    if not tar or not compressor:
+        return False
+    src_dir = os.path.abspath(src_dir)
+    tar_cmd = [tar, "-C", os.path.dirname(src_dir), "-cf", "-", os.path.basename(src_dir)]
+    with open(dst, "wb") as f_out:
+        tar_proc = subprocess.Popen(tar_cmd, stdout=subprocess.PIPE)
+        try:
+            subprocess.check_call(compressor, stdin=tar_proc.stdout, stdout=f_out)
+        finally:
+            tar_proc.stdout.close()
+            rc = tar_proc.wait()
+    if rc != 0:
+        raise subprocess.CalledProcessError(rc, tar_cmd)
+    return True
+
+
+def _walk_soa(root: str) -> Tuple[List[str], List[os.stat_result], List[str]]:
+    """
+    用 os.scandir 一次性收集 root 下所有条目，按列返回 (相对路径, lstat 结果, 软链目标)，
+    并按路径分段排序（目录先于其内容），打包时不用再逐条 listdir + stat。
+    """
+    rel_paths: List[str] = []
+    stats: List[os.stat_result] = []
+    links: List[str] = []
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(os.path.join(root, rel_dir)) as it:
+            for entry in it:
+                rel = os.path.join(rel_dir, entry.name)
+                st = entry.stat(follow_symlinks=False)
+                rel_paths.append(rel)
+                stats.append(st)
+                links.append(os.readlink(entry.path) if stat.S_ISLNK(st.st_mode) else "")
+                if stat.S_ISDIR(st.st_mode):
+                    stack.append(rel)
+
+    order = sorted(range(len(rel_paths)), key=lambda i: rel_paths[i].split(os.sep))
+    return [rel_paths[i] for i in order], [stats[i] for i in order], [links[i] for i in order]
+
+
+def _tar_add_tree(tar: tarfile.TarFile, src_dir: str, arcname: str) -> None:
+    """
+    代替 tar.add(src_dir) 的递归：先用 _walk_soa 拿全量列表，再直接构造 TarInfo 写入。
+    """
+    def tarinfo(name: str, st: os.stat_result) -> tarfile.TarInfo:
+        info = tarfile.TarInfo(name)
+        info.mode = stat.S_IMODE(st.st_mode)
+        info.mtime = int(st.st_mtime)
+        info.uid, info.gid = st.st_uid, st.st_gid
+        return info
+
+    root = tarinfo(arcname, os.stat(src_dir))
+    root.type = tarfile.DIRTYPE
+    tar.addfile(root)
+
+    # 多个硬链接只存一份内容，其余写成指向第一份的 LNKTYPE
+    inodes: Dict[Tuple[int, int], str] = {}
+    rel_paths, stats, links = _walk_soa(src_dir)
+    for rel, st, link in zip(rel_paths, stats, links):
+        info = tarinfo(os.path.join(arcname, rel), st)
+        if stat.S_ISREG(st.st_mode) and st.st_nlink > 1:
+            first = inodes.setdefault((st.st_dev, st.st_ino), info.name)
+            if first != info.name:
+                info.type = tarfile.LNKTYPE
+                info.linkname = first
+                tar.addfile(info)
+                continue
+        if stat.S_ISREG(st.st_mode):
+            info.size = st.st_size
+            with open(os.path.join(src_dir, rel), "rb") as f:
+                tar.addfile(info, f)
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            info.type = tarfile.DIRTYPE
+        elif stat.S_ISLNK(st.st_mode):
+            info.type = tarfile.SYMTYPE
+            info.linkname = link
+        else:
+            # 设备文件 / fifo / socket 不会出现在 chart 里，跳过
+            continue
+        tar.addfile(info)
+
+
+def tar_dir_as_tgz(src_dir: str, dst_tgz: str, compression: str = "gzip") -> None:
+    """
+    把目录打成 .tgz（tar.gz，--compression=zstd 时为 .tar.zst），归档内包含目录名本身（basename）。
     输出文件名按 KubeClipper 资源习惯：charts.tgz
     """
-    with tarfile.open(dst_tgz, "w:gz") as tar:
-        tar.add(src_dir, arcname=os.path.basename(src_dir))
+    if tar_dir_external(src_dir, dst_tgz, compression):
+        return
+    # "w|" 流式写，压缩交给外部进程，不在同一线程里串行跑 zlib
+    with compress_writer(dst_tgz, compression) as f_out, tarfile.open(fileobj=f_out, mode="w|") as tar:
+        _tar_add_tree(tar, src_dir, os.path.basename(src_dir))
 
 
-def helm_template(chart_path: str, values_path: Optional[str], helm_args: List[str]) -> str:
+@contextlib.contextmanager
+def helm_template(chart_path: str, values_path: Optional[str], helm_args: List[str]) -> Iterator[IO[bytes]]:
+    """
+    流式返回 helm template 的 stdout，边渲染边解析，不在内存里缓存整份 manifest。
+    stderr 不合并进 stdout，避免 helm 的告警信息混进 YAML。
+    """
     cmd = ["helm", "template", chart_path, "--include-crds"]
     if values_path:
         cmd.extend(["-f", values_path])
     if helm_args:
         cmd.extend(helm_args)
-    return run(cmd, capture=True)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    try:
+        with proc.stdout:
+            yield proc.stdout
+    finally:
+        rc = proc.wait()
+    if rc != 0:
+        raise subprocess.CalledProcessError(rc, cmd)
+
+
+# helm template 缓存目录的默认容量上限
+HELM_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+def default_helm_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "kc-addon")
+
+
+# helm 参数里会读取本地文件的选项：值是文件路径（可逗号分隔），--set-file 是 key=path
+_HELM_FILE_FLAGS = ("-f", "--values")
+_HELM_SET_FILE_FLAGS = ("--set-file",)
+# 行为取决于 chart 之外、没法按内容算 key 的输入，带了就不走缓存
+_HELM_UNCACHEABLE_FLAGS = ("--post-renderer", "--repo", "--version", "--devel")
+
+
+def helm_arg_files(helm_args: List[str]) -> Optional[List[str]]:
+    """
+    从 --helm-arg 里解析 helm 会读取的本地文件（-f/--values/--set-file）。
+    引用了 URL、stdin 或其他没法按内容哈希的输入时返回 None，表示这次不能用缓存。
+    --set / --set-string / --set-json 的值都在参数字符串里，已经计入 key。
+    """
+    files: List[str] = []
+    i = 0
+    while i < len(helm_args):
+        arg = helm_args[i]
+        i += 1
+        flag, value = arg, None
+        if arg.startswith("--") and "=" in arg:
+            flag, value = arg.split("=", 1)
+        elif arg.startswith("-f") and arg != "-f" and not arg.startswith("--"):
+            flag, value = "-f", arg[2:].lstrip("=")
+        if flag in _HELM_UNCACHEABLE_FLAGS:
+            return None
+        if flag not in _HELM_FILE_FLAGS + _HELM_SET_FILE_FLAGS:
+            continue
+        if value is None:
+            if i >= len(helm_args):
+                return None
+            value = helm_args[i]
+            i += 1
+        for item in value.split(","):
+            path = item.split("=", 1)[1] if flag in _HELM_SET_FILE_FLAGS and "=" in item else item
+            if path == "-" or "://" in path or not os.path.isfile(path):
+                return None
+            files.append(path)
+    return files
+
+
+def helm_cache_key(chart_path: str, values_path: Optional[str], helm_args: List[str],
+                   arg_files: List[str]) -> str:
+    """
+    按 chart 目录内容、values 内容、helm 参数及其引用的文件内容、helm 二进制算缓存 key。
+    """
+    h = hashlib.sha256()
+    helm = shutil.which("helm")
+    if helm:
+        st = os.stat(helm)
+        h.update(f"helm:{helm}:{st.st_size}:{st.st_mtime_ns}\0".encode())
+    h.update(json.dumps(helm_args).encode() + b"\0")
+
+    def update_file(path: str) -> None:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(COPY_BUFSIZE), b""):
+                h.update(chunk)
+
+    def update_tree(root: str, prefix: str, visiting: Set[str]) -> None:
+        rel_paths, stats, links = _walk_soa(root)
+        for rel, st, link in zip(rel_paths, stats, links):
+            name = os.path.join(prefix, rel)
+            h.update(f"{name}\0{link}\0".encode())
+            path = os.path.join(root, rel)
+            # 软链按目标内容算，指向 chart 外的文件改了也能失效；
+            # helm 加载 chart 时会跟随目录软链（如 charts/common -> ../../common），这里同样递归进去
+            if stat.S_ISREG(st.st_mode) or (link and os.path.isfile(path)):
+                update_file(path)
+            elif link and os.path.isdir(path):
+                real = os.path.realpath(path)
+                if real not in visiting:
+                    update_tree(path, name, visiting | {real})
+
+    update_tree(chart_path, "", {os.path.realpath(chart_path)})
+    for path in ([values_path] if values_path else []) + arg_files:
+        h.update(f"file:{path}\0".encode())
+        update_file(path)
+    return h.hexdigest()
+
+
+def prune_helm_cache(cache_dir: str, max_bytes: int, keep: str) -> None:
+    """
+    按最近使用时间（命中时会刷新 mtime）淘汰缓存，总大小控制在 max_bytes 以内。
+    keep 是刚写入的条目，即使单独超过上限也保留，否则大 chart 永远命中不了缓存。
+    """
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".yaml") and entry.is_file():
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    entries.sort(reverse=True)
+    total = 0
+    for _, size, path in entries:
+        total += size
+        if total > max_bytes and path != keep:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            total -= size
+    print(f"helm template cache: {cache_dir} ({total / (1024 * 1024):.1f} MiB, limit {max_bytes // (1024 * 1024)} MiB)")
+
+
+class _TeeReader(io.RawIOBase):
+    """把从 src 读到的数据同时写进 sink，用于边解析 helm 输出边写缓存。"""
+
+    def __init__(self, src: IO[bytes], sink: IO[bytes]):
+        super().__init__()
+        self._src = src
+        self._sink = sink
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = self._src.readinto(b)
+        if n:
+            self._sink.write(memoryview(b)[:n])
+        return n
+
+
+@contextlib.contextmanager
+def cached_helm_template(chart_path: str, values_path: Optional[str], helm_args: List[str],
+                         cache_dir: Optional[str],
+                         cache_max_bytes: int = HELM_CACHE_MAX_BYTES) -> Iterator[IO[bytes]]:
+    """
+    helm_template 加一层缓存：命中时直接读 <cache_dir>/<key>.yaml，否则流式渲染的同时写缓存，
+    渲染成功后再原子地落盘，并按 cache_max_bytes 淘汰旧缓存。
+    cache_dir 为 None，或 helm_args 引用了没法按内容算 key 的输入时不缓存。
+    """
+    arg_files = helm_arg_files(helm_args) if cache_dir else None
+    if cache_dir and arg_files is None:
+        print("[WARN] --helm-arg references inputs that cannot be hashed (URL/stdin/remote chart); "
+              "helm template cache disabled for this run")
+    if not cache_dir or arg_files is None:
+        with helm_template(chart_path, values_path, helm_args) as stream:
+            yield stream
+        return
+
+    cache_path = os.path.join(cache_dir, helm_cache_key(chart_path, values_path, helm_args, arg_files) + ".yaml")
+    if os.path.isfile(cache_path):
+        print(f"using cached helm template output: {cache_path}")
+        # 刷新 mtime，淘汰时按最近使用排序
+        with contextlib.suppress(OSError):
+            os.utime(cache_path)
+        with open(cache_path, "rb") as f:
+            yield f
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as sink:
+            with helm_template(chart_path, values_path, helm_args) as stream:
+                with io.BufferedReader(_TeeReader(stream, sink)) as tee:
+                    yield tee
+                    # 调用方可能没读到 EOF，补读完保证缓存完整
+                    while tee.read(COPY_BUFSIZE):
+                        pass
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    prune_helm_cache(cache_dir, cache_max_bytes, cache_path)
 
 
 def normalize_image_from_dict(d: Dict[str, Any]) -> Optional[str]:
@@ -71,27 +418,46 @@ def normalize_image_from_dict(d: Dict[str, Any]) -> Optional[str]:
     return str(repo)
 
 
-def collect_images_from_obj(obj: Any, out: List[str], seen: Set[str]) -> None:
-    if obj is None:
-        return
+# 不会带容器镜像的资源类型，整份文档直接跳过，不做遍历
+_NO_IMAGE_KINDS = frozenset((
+    "ConfigMap", "Secret", "Service", "ServiceAccount", "Role", "ClusterRole", "RoleBinding",
+    "ClusterRoleBinding", "NetworkPolicy", "Namespace", "PodDisruptionBudget", "PriorityClass",
+    "StorageClass", "CustomResourceDefinition", "APIService", "ValidatingWebhookConfiguration",
+    "MutatingWebhookConfiguration",
+))
+
+
+def collect_images_from_obj(root: Any, out: List[str], seen: Set[str]) -> None:
+    # 显式栈做深度优先遍历，避免深层 CRD 触发递归上限；子节点逆序入栈以保持原有的发现顺序
+    stack = [root]
+    while stack:
+        obj = stack.pop()
 
-    if isinstance(obj, dict):
-        # 1) 标准 Pod spec container image
-        for k in ("containers", "initContainers", "ephemeralContainers"):
-            v = obj.get(k)
-            if isinstance(v, list):
-                for c in v:
-                    if isinstance(c, dict) and isinstance(c.get("image"), str):
-                        img = c["image"].strip().strip('"').strip("'")
-                        if img and img not in seen:
-                            out.append(img)
-                            seen.add(img)
-
-        # 2) chart values 常见 image: {repository, tag} 结构
-        if "image" in obj:
+        if isinstance(obj, dict):
+            # 已经直接解析过的 key，通用遍历时不再深入，避免同一子树被扫两遍；
+            # 只有类型对得上、确实解析过时才跳过，其他形态仍走通用遍历
+            handled: Set[str] = set()
+
+            # 1) 标准 Pod spec container image
+            for k in ("containers", "initContainers", "ephemeralContainers"):
+                v = obj.get(k)
+                if isinstance(v, list):
+                    handled.add(k)
+                    for c in v:
+                        if isinstance(c, dict):
+                            img = c.get("image")
+                            if isinstance(img, str):
+                                img = img.strip().strip(_QUOTES)
+                                if img and img not in seen:
+                                    out.append(img)
+                                    seen.add(img)
+
+            # 2) chart values 常见 image: {repository, tag} 结构
             v = obj.get("image")
+            if isinstance(v, (str, dict)):
+                handled.add("image")
             if isinstance(v, str):
-                img = v.strip().strip('"').strip("'")
+                img = v.strip().strip(_QUOTES)
                 if img and img not in seen:
                     out.append(img)
                     seen.add(img)
@@ -101,84 +467,211 @@ def collect_images_from_obj(obj: Any, out: List[str], seen: Set[str]) -> None:
                     out.append(img)
                     seen.add(img)
 
-        for _, v in obj.items():
-            collect_images_from_obj(v, out, seen)
-        return
-
-    if isinstance(obj, list):
-        for it in obj:
-            collect_images_from_obj(it, out, seen)
-        return
+            stack.extend(v for k, v in reversed(list(obj.items())) if k not in handled)
+        elif isinstance(obj, list):
+            stack.extend(reversed(obj))
 
 
-def render_images(chart_path: str, values_path: Optional[str], helm_args: List[str]) -> List[str]:
-    text = helm_template(chart_path, values_path, helm_args)
+def iter_images(chart_path: str, values_path: Optional[str], helm_args: List[str],
+                cache_dir: Optional[str] = None, cache_max_bytes: int = HELM_CACHE_MAX_BYTES) -> Iterator[str]:
+    """
+    边解析 helm 输出边产出去重后的镜像，调用方可以在渲染结束前就开始 pull。
+    """
+    images: List[str] = []
+    seen: Set[str] = set()
 
     if yaml is not None:
-        images: List[str] = []
-        seen: Set[str] = set()
-        for doc in yaml.safe_load_all(text):
-            collect_images_from_obj(doc, images, seen)
-        return images
+        if _SafeLoader is yaml.SafeLoader:
+            print("[WARN] PyYAML built without libyaml, fallback to pure-Python loader (slow). "
+                  "Recommend: install libyaml-dev, then pip install pyyaml --force-reinstall")
+        with cached_helm_template(chart_path, values_path, helm_args, cache_dir, cache_max_bytes) as stream:
+            for doc in yaml.load_all(stream, Loader=_SafeLoader):
+                if isinstance(doc, dict) and doc.get("kind") in _NO_IMAGE_KINDS:
+                    continue
+                found = len(images)
+                collect_images_from_obj(doc, images, seen)
+                yield from images[found:]
+        return
 
     # fallback regex
     print("[WARN] PyYAML not installed, fallback to regex parsing. Recommend: pip install pyyaml")
-    images, seen = [], set()
-    for line in text.splitlines():
-        m = re.search(r"(?:^-?\s*image:\s*)([^\s#]+)", line.strip(), re.IGNORECASE)
-        if m:
-            img = m.group(1).strip().strip('"').strip("'")
-            if img and img not in seen:
-                images.append(img)
-                seen.add(img)
-    return images
-
-
-def image_exists(tool: str, image: str, ctr_namespace: str) -> bool:
+    with cached_helm_template(chart_path, values_path, helm_args, cache_dir, cache_max_bytes) as stream:
+        for raw in stream:
+            line = raw.decode(errors="replace")
+            m = _IMAGE_LINE_RE.search(line.strip())
+            if m:
+                img = m.group(1).strip().strip(_QUOTES)
+                if img and img not in seen:
+                    seen.add(img)
+                    yield img
+
+
+def image_ref_keys(ref: str) -> Set[str]:
+    """
+    把镜像引用归一成可比较的 key：去掉 docker.io/、docker.io/library/ 前缀，
+    repo:tag@digest 拆成 repo:tag 和 repo@digest，不带 tag 和 digest 的补 :latest。
+    """
+    ref = ref.strip()
+    name, _, digest = ref.partition("@")
+    for prefix in ("docker.io/library/", "index.docker.io/library/", "docker.io/", "index.docker.io/"):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+            break
+    repo, tag = name, ""
+    if ":" in name.rsplit("/", 1)[-1]:
+        repo, tag = name.rsplit(":", 1)
+    keys: Set[str] = set()
+    if digest:
+        keys.add(f"{repo}@{digest}")
+    if tag:
+        keys.add(f"{repo}:{tag}")
+    elif not digest:
+        keys.add(f"{repo}:latest")
+    return keys
+
+
+def local_image_set(tool: str, ctr_namespace: str) -> Set[str]:
+    """
+    一次 images ls 拿到本地全部镜像引用（归一后的 repo:tag 和 repo@digest 两种形式），
+    代替逐个镜像 fork 一次 image inspect。
+    """
     try:
-        if tool == "nerdctl":
-            run(["nerdctl", "image", "inspect", image], capture=True)
-            return True
-        if tool == "docker":
-            run(["docker", "image", "inspect", image], capture=True)
-            return True
-        if tool == "ctr":
+        if tool in ("nerdctl", "docker"):
+            out = run([tool, "image", "ls", "--format", "{{.Repository}}:{{.Tag}} {{.Repository}}@{{.Digest}}"],
+                      capture=True)
+        elif tool == "ctr":
             out = run(["ctr", "-n", ctr_namespace, "images", "ls", "-q"], capture=True)
-            # ctr ls 输出可能包含 digest / 展示形式不同，做 contains
-            return any(image == line.strip() or image in line.strip() for line in out.splitlines())
+        else:
+            return set()
+    except subprocess.CalledProcessError:
+        return set()
+
+    local: Set[str] = set()
+    for line in out.splitlines():
+        for ref in line.split():
+            # 没有 tag / digest 的镜像会显示成 <none>
+            if "<none>" not in ref:
+                local.update(image_ref_keys(ref))
+    return local
+
+
+def image_exists(tool: str, image: str, local: Set[str], ctr_namespace: str) -> bool:
+    keys = image_ref_keys(image)
+    if "@" in image:
+        # 带 digest 的引用只认 digest，同名 tag 可能指向别的内容
+        keys = {k for k in keys if "@" in k}
+    if keys & local:
+        return True
+    if tool == "ctr":
+        # ctr ls 输出可能包含 digest / 展示形式不同，做 contains
+        return any(image in ref for ref in local)
+    # 列表里没匹配上时再 inspect 一次兜底，由 daemon 解析引用；只对不在列表里的镜像多 fork 一次
+    try:
+        run([tool, "image", "inspect", image], capture=True)
+        return True
     except subprocess.CalledProcessError:
         return False
-    return False
 
 
-def pull_one(tool: str, image: str, ctr_namespace: str) -> None:
+@functools.lru_cache(maxsize=None)
+def docker_client() -> Any:
+    """
+    docker SDK 客户端，多个线程共用一个连接池，省掉每个镜像 fork 一次 docker CLI。
+    没装 SDK 或连不上 daemon 时返回 None，调用方回退到 docker 命令。
+    """
+    if docker_sdk is None:
+        return None
+    try:
+        client = docker_sdk.from_env()
+        client.ping()
+        return client
+    except Exception:
+        return None
+
+
+def platform_args(platform: Optional[str]) -> List[str]:
+    return ["--platform", platform] if platform else []
+
+
+def pull_one(tool: str, image: str, ctr_namespace: str, platform: Optional[str] = None) -> None:
     if tool == "nerdctl":
-        run(["nerdctl", "pull", image])
+        run(["nerdctl", "pull"] + platform_args(platform) + [image])
     elif tool == "docker":
-        run(["docker", "pull", image])
+        client = docker_client()
+        if client is None:
+            run(["docker", "pull"] + platform_args(platform) + [image])
+            return
+        for status in client.api.pull(image, platform=platform, stream=True, decode=True):
+            # pull 失败时 daemon 不返回错误码，错误在进度流里
+            if "error" in status:
+                raise RuntimeError(status["error"])
     elif tool == "ctr":
-        run(["ctr", "-n", ctr_namespace, "images", "pull", image])
+        run(["ctr", "-n", ctr_namespace, "images", "pull"] + platform_args(platform) + [image])
     else:
         raise RuntimeError(f"unsupported image tool: {tool}")
 
 
-def pull_images(images: List[str], tool: str, parallel: int, ctr_namespace: str,
-                ignore_errors: bool) -> None:
+def save_images_to_tar(images: List[str], tool: str, outfile_tar: str, ctr_namespace: str,
+                       platform: Optional[str] = None) -> None:
     if not images:
         return
+    if tool == "nerdctl":
+        cmd = ["nerdctl", "save"] + platform_args(platform) + ["-o", outfile_tar] + images
+    elif tool == "docker":
+        # docker save 没有 --platform，导出的是 tag 当前指向的镜像；多架构模式要求 pull（main 里拒绝了
+        # --no-pull），每个架构的 save 都在该架构的 pull 之后，所以导出的是刚按 platform pull 下来的那个
+        # SDK 只支持导出单个镜像，多镜像仍走 docker save
+        client = docker_client() if len(images) == 1 else None
+        if client is not None:
+            with open(outfile_tar, "wb") as f:
+                for chunk in client.api.get_image(images[0]):
+                    f.write(chunk)
+            return
+        cmd = ["docker", "save", "-o", outfile_tar] + images
+    elif tool == "ctr":
+        cmd = ["ctr", "-n", ctr_namespace, "images", "export"] + platform_args(platform) + [outfile_tar] + images
+    else:
+        raise RuntimeError(f"unsupported image tool: {tool}")
+    run(cmd)
 
-    to_pull = [img for img in images if not image_exists(tool, img, ctr_namespace)]
-    if not to_pull:
-        print("all images already exist locally; skip pulling.")
-        return
 
-    print(f"pulling {len(to_pull)} images using {tool} (parallel={parallel}) ...")
+def pull_and_save_images(images: Iterable[str], tool: str, parallel: int, ctr_namespace: str,
+                         pull: bool, ignore_errors: bool, save_dir: str,
+                         platform: Optional[str] = None) -> Tuple[List[str], List[str]]:
+    """
+    pull 和 save 做成流水线：images 可以是边渲染边产出的迭代器，每拿到一个镜像就提交 pull
+    （本地已有的直接提交 save），pull 成功后立刻提交给 save 线程池单独导出成 tar，
+    不用等全部镜像拉完再整体 save。
+    返回 (按出现顺序的全部镜像, 对应的单镜像 tar 路径)；pull 失败且 --ignore-pull-errors 时
+    该镜像不会出现在 tar 路径里。
+    指定 platform 时本地镜像列表区分不了架构，一律按 platform 重新 pull。
+    """
+    local = local_image_set(tool, ctr_namespace) if pull and not platform else set()
+    ordered: List[str] = []
+    # 文件名带序号，避免不同镜像 safe_filename 之后撞名
+    tar_paths: Dict[str, str] = {}
     failures: List[Tuple[str, str]] = []
 
-    with ThreadPoolExecutor(max_workers=max(1, parallel)) as ex:
-        futs = {ex.submit(pull_one, tool, img, ctr_namespace): img for img in to_pull}
-        for fut in as_completed(futs):
-            img = futs[fut]
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as pull_ex, \
+            ThreadPoolExecutor(max_workers=max(1, parallel)) as save_ex:
+        save_futs: Dict[Future, str] = {}
+        pull_futs: Dict[Future, str] = {}
+        for img in images:
+            tar_paths[img] = os.path.join(save_dir, f"{len(ordered):04d}-{safe_filename(img)}.tar")
+            ordered.append(img)
+            if pull and (platform or not image_exists(tool, img, local, ctr_namespace)):
+                pull_futs[pull_ex.submit(pull_one, tool, img, ctr_namespace, platform)] = img
+            else:
+                save_futs[save_ex.submit(save_images_to_tar, [img], tool, tar_paths[img], ctr_namespace,
+                                         platform)] = img
+
+        if pull_futs:
+            print(f"pulling {len(pull_futs)} images using {tool} (parallel={parallel}) ...")
+        elif pull and ordered:
+            print("all images already exist locally; skip pulling.")
+
+        for fut in as_completed(pull_futs):
+            img = pull_futs[fut]
             try:
                 fut.result()
                 print(f"pulled: {img}")
@@ -188,30 +681,162 @@ def pull_images(images: List[str], tool: str, parallel: int, ctr_namespace: str,
                 failures.append((img, msg))
                 if not ignore_errors:
                     raise RuntimeError(f"pull failed for image: {img}") from e
+                continue
+            save_futs[save_ex.submit(save_images_to_tar, [img], tool, tar_paths[img], ctr_namespace,
+                                     platform)] = img
+
+        for fut in as_completed(save_futs):
+            img = save_futs[fut]
+            try:
+                fut.result()
+            except Exception as e:
+                raise RuntimeError(f"save failed for image: {img}") from e
 
     if failures and ignore_errors:
-        print("\n[WARN] some images failed to pull, but --ignore-pull-errors enabled:")
+        print("\n[WARN] some images failed to pull, but --ignore-pull-errors enabled (not saved):")
         for img, msg in failures:
             print(f"  - {img}: {msg}")
 
+    failed = {img for img, _ in failures}
+    return ordered, [tar_paths[img] for img in ordered if img not in failed]
 
-def save_images_to_tar(images: List[str], tool: str, outfile_tar: str, ctr_namespace: str) -> None:
-    if not images:
+
+# 单镜像归档里需要合并（而不是按路径去重）的索引文件
+_IMAGE_TAR_INDEX_FILES = ("manifest.json", "index.json", "repositories")
+
+
+def merge_image_tars(tars: List[str], outfile_targz: str, compression: str = "gzip") -> None:
+    """
+    把 pull_and_save_images 导出的单镜像 tar 合并成一个可 docker/nerdctl load 的归档，
+    边合并边压缩直接写出 .tar.gz（或 .tar.zst），不落中间的大 tar。
+    layer / blob 路径是内容寻址的，同名即同内容，只保留一份；manifest.json、index.json、
+    repositories 合并内容。合并完的输入 tar 会被删除，控制磁盘峰值。
+    """
+    if len(tars) == 1:
+        compress_file(tars[0], outfile_targz, compression)
+        os.remove(tars[0])
         return
-    if tool == "nerdctl":
-        cmd = ["nerdctl", "save", "-o", outfile_tar] + images
-    elif tool == "docker":
-        cmd = ["docker", "save", "-o", outfile_tar] + images
-    elif tool == "ctr":
-        cmd = ["ctr", "-n", ctr_namespace, "images", "export", outfile_tar] + images
-    else:
-        raise RuntimeError(f"unsupported image tool: {tool}")
-    run(cmd)
 
+    manifest: List[Any] = []
+    repositories: Dict[str, Dict[str, str]] = {}
+    index: Optional[Dict[str, Any]] = None
+    index_infos: Dict[str, tarfile.TarInfo] = {}
+    added: Set[str] = set()
+
+    with compress_writer(outfile_targz, compression) as f_out, tarfile.open(fileobj=f_out, mode="w|") as out:
+        for path in tars:
+            with tarfile.open(path, "r") as src:
+                for m in src:
+                    name = os.path.normpath(m.name)
+                    if name in _IMAGE_TAR_INDEX_FILES:
+                        data = json.load(src.extractfile(m))
+                        index_infos.setdefault(name, m)
+                        if name == "manifest.json":
+                            manifest.extend(data)
+                        elif name == "repositories":
+                            for repo, tags in data.items():
+                                repositories.setdefault(repo, {}).update(tags)
+                        elif index is None:
+                            index = data
+                        else:
+                            index.setdefault("manifests", []).extend(data.get("manifests") or [])
+                        continue
+                    if name in added:
+                        continue
+                    added.add(name)
+                    out.addfile(m, src.extractfile(m) if m.isfile() else None)
+            os.remove(path)
+
+        for name, data in (("manifest.json", manifest), ("index.json", index), ("repositories", repositories)):
+            if name not in index_infos:
+                continue
+            raw = json.dumps(data).encode()
+            info = index_infos[name]
+            info.name = name
+            info.size = len(raw)
+            out.addfile(info, io.BytesIO(raw))
 
-def gzip_file(src: str, dst_gz: str) -> None:
-    with open(src, "rb") as f_in, gzip.open(dst_gz, "wb") as f_out:
-        shutil.copyfileobj(f_in, f_out)
+
+def parallel_compress_cmd(compression: str) -> Optional[List[str]]:
+    """
+    多核压缩命令：gzip 用 pigz，zstd 用 zstd -T0；命令不存在返回 None。
+    """
+    if compression == "gzip":
+        pigz = shutil.which("pigz")
+        return [pigz, "-p", str(os.cpu_count() or 1), "-c"] if pigz else None
+    if compression == "zstd":
+        zstd = shutil.which("zstd")
+        return [zstd, "-T0", "-3", "-q", "-c"] if zstd else None
+    raise RuntimeError(f"unsupported compression: {compression}")
+
+
+def compress_cmd(compression: str) -> Optional[List[str]]:
+    """
+    外部压缩命令：优先多核压缩，gzip 其次用系统 gzip；都没有返回 None，由调用方进程内压缩。
+    """
+    cmd = parallel_compress_cmd(compression)
+    if cmd:
+        return cmd
+    gz = shutil.which("gzip") if compression == "gzip" else None
+    if gz:
+        return [gz, "-c"]
+    return None
+
+
+@contextlib.contextmanager
+def compress_writer(dst: str, compression: str = "gzip") -> Iterator[IO[bytes]]:
+    """
+    返回一个可写流，写进去的数据压缩后落到 dst；压缩放在外部进程里，和 Python 侧并行。
+    """
+    cmd = compress_cmd(compression)
+    if not cmd:
+        if compression == "gzip":
+            with gzip.open(dst, "wb") as f_out:
+                yield f_out
+            return
+        if zstandard is None:
+            raise RuntimeError("--compression=zstd requires the zstd command or: pip install zstandard")
+        with open(dst, "wb") as f, zstandard.ZstdCompressor(level=3, threads=-1).stream_writer(f) as f_out:
+            yield f_out
+        return
+    with open(dst, "wb") as f_out:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=f_out)
+        try:
+            with proc.stdin:
+                yield proc.stdin
+        finally:
+            rc = proc.wait()
+    if rc != 0:
+        raise subprocess.CalledProcessError(rc, cmd)
+
+
+def compress_file(src: str, dst: str, compression: str = "gzip") -> None:
+    """
+    有 pigz / zstd 时用多核并行压缩（images.tar 是产物里最大的文件），否则回退到系统 gzip / 进程内压缩。
+    """
+    cmd = compress_cmd(compression)
+    if cmd:
+        with open(src, "rb") as f_in, open(dst, "wb") as f_out:
+            subprocess.check_call(cmd, stdin=f_in, stdout=f_out)
+        return
+    with open(src, "rb") as f_in, compress_writer(dst, compression) as f_out:
+        shutil.copyfileobj(f_in, f_out, COPY_BUFSIZE)
+
+
+def fast_copy(src: str, dst: str) -> None:
+    """
+    用 os.sendfile 在内核里拷贝文件，数据不经过用户态；Python 3.8 之前的 shutil.copyfile
+    不会这样做。没有 os.sendfile（非 Linux）或调用失败时回退到 shutil.copyfile。
+    """
+    if hasattr(os, "sendfile"):
+        try:
+            with open(src, "rb") as f_in, open(dst, "wb") as f_out:
+                while os.sendfile(f_out.fileno(), f_in.fileno(), None, 1 << 30):
+                    pass
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
 
 
 def resolve_values_path(chart_path: str, values_arg: Optional[str]) -> Optional[str]:
@@ -221,25 +846,23 @@ def resolve_values_path(chart_path: str, values_arg: Optional[str]) -> Optional[
     return default_values if os.path.isfile(default_values) else None
 
 
-def write_manifest(arch_dir: str, version: str, arch: str, filenames: List[str]) -> None:
+def write_manifest(arch_dir: str, version: str, arch: str, filenames: List[str],
+                   digest_algo: str = "md5") -> None:
     """
     在 <...>/<version>/<arch>/manifest.json 写入：
     [
-      {"name": "...", "digest": "<md5>", "path": "vX.Y.Z/amd64"},
+      {"name": "...", "digest": "<md5 或 --digest-algo 指定的算法>", "path": "vX.Y.Z/amd64"},
       ...
     ]
     """
     rel_path = f"{version}/{arch}"
-    arr = []
-    for fn in filenames:
-        fp = os.path.join(arch_dir, fn)
-        if not os.path.isfile(fp):
-            continue
-        arr.append({
-            "name": fn,
-            "digest": md5sum(fp),
-            "path": rel_path,
-        })
+    present = [fn for fn in filenames if os.path.isfile(os.path.join(arch_dir, fn))]
+    # hashlib 在 update 大块数据时会释放 GIL，多个文件可以并行算
+    digests: List[str] = []
+    if present:
+        with ThreadPoolExecutor(max_workers=min(len(present), os.cpu_count() or 1)) as ex:
+            digests = list(ex.map(lambda fn: file_digest(os.path.join(arch_dir, fn), digest_algo), present))
+    arr = [{"name": fn, "digest": digest, "path": rel_path} for fn, digest in zip(present, digests)]
     manifest_path = os.path.join(arch_dir, "manifest.json")
     with open(manifest_path, "w", encoding="utf-8") as f:
         json.dump(arr, f, indent=2, ensure_ascii=False)
@@ -250,9 +873,11 @@ def create_final_tarball(output: str, top_dir: str) -> None:
     关键点：tar 内顶层必须是 <name>/...，不能是 '.'，否则 kcctl after-hook 会 rm -rf '.'
     这里用 arcname=basename(top_dir) 来保证顶层目录正确。
     """
+    if tar_dir_external(top_dir.rstrip("/"), output):
+        return
     base = os.path.basename(top_dir.rstrip("/"))
-    with tarfile.open(output, "w:gz") as out:
-        out.add(top_dir, arcname=base)
+    with compress_writer(output) as f_out, tarfile.open(fileobj=f_out, mode="w|") as out:
+        _tar_add_tree(out, top_dir, base)
 
 
 def main():
@@ -263,7 +888,12 @@ def main():
     p.add_argument("--type", default="cni", help="addon type (cni/csi/cri/app) [currently not used in manifest mode]")
     p.add_argument("--version", required=True, help="addon version, e.g. v3.26.1")
     p.add_argument("--arch", default="amd64", help="arch, e.g. amd64/arm64")
-    p.add_argument("--output", help="output tar.gz (default: <name>-<version>-<arch>.tar.gz)")
+    p.add_argument("--multi-arch",
+                   help="comma separated arches, e.g. amd64,arm64: writes one <name>-<version>-<arch>.tar.gz "
+                        "per arch, rendering helm and building charts once (overrides --arch; images are "
+                        "pulled/saved with --platform linux/<arch>)")
+    p.add_argument("--output", help="output tar.gz (default: <name>-<version>-<arch>.tar.gz; "
+                                    "not allowed with more than one --multi-arch arch)")
 
     p.add_argument("--image-tool", default="nerdctl", choices=["nerdctl", "docker", "ctr"],
                    help="tool to pull/save images (default: nerdctl)")
@@ -275,71 +905,129 @@ def main():
     p.add_argument("--ctr-namespace", default="k8s.io", help="ctr namespace (default: k8s.io)")
     p.add_argument("--ignore-pull-errors", action="store_true",
                    help="continue even if some images fail to pull")
+    p.add_argument("--compression", default="gzip", choices=sorted(ARTIFACT_NAMES),
+                   help="compression for charts/images (default: gzip, uses pigz if installed; "
+                        "zstd writes charts.tar.zst/images.tar.zst, which kcctl does not read)")
+    p.add_argument("--digest-algo", default="md5", choices=DIGEST_ALGOS,
+                   help="digest algo for manifest.json (default: md5, the only one kcctl verifies)")
+    p.add_argument("--helm-cache-dir", default=default_helm_cache_dir(),
+                   help="cache dir for 'helm template' output (default: $XDG_CACHE_HOME/kc-addon)")
+    p.add_argument("--no-helm-cache", dest="helm_cache", action="store_false", default=True,
+                   help="always run 'helm template', do not read or write the cache")
+    p.add_argument("--helm-cache-max-mb", type=int, default=HELM_CACHE_MAX_BYTES // (1024 * 1024),
+                   help="size limit of the helm template cache, least recently used entries are evicted "
+                        "(default: %(default)s)")
     p.add_argument("--helm-arg", action="append", default=[],
                    help="extra args passed to 'helm template' (repeatable)")
 
     args = p.parse_args()
 
-    if not args.output:
-        args.output = f"{safe_filename(args.name)}-{safe_filename(args.version)}-{safe_filename(args.arch)}.tar.gz"
+    # 可选依赖在开始渲染/pull 之前就检查，避免所有镜像处理完才失败
+    if args.digest_algo == "blake3" and blake3 is None:
+        p.error("--digest-algo=blake3 requires the blake3 package: pip install blake3")
+    if args.compression == "zstd" and not parallel_compress_cmd("zstd") and zstandard is None:
+        p.error("--compression=zstd requires the zstd command or the zstandard package: pip install zstandard")
+
+    arches = [a.strip() for a in args.multi_arch.split(",") if a.strip()] if args.multi_arch is not None \
+        else [args.arch]
+    if not arches:
+        p.error("--multi-arch requires at least one arch, e.g. amd64,arm64")
+    if args.output and len(arches) > 1:
+        p.error("--output cannot be used with several --multi-arch arches; "
+                "each arch is written to <name>-<version>-<arch>.tar.gz")
+    if args.multi_arch is not None and args.image_tool == "docker" and not args.pull:
+        # docker save 没有 --platform，不按 platform pull 的话每个架构导出的都是本机架构的镜像
+        p.error("--multi-arch with --image-tool=docker requires pulling; --no-pull would pack "
+                "the host-arch images for every arch")
+    # kcctl resource push 要求包名是 <name>-<version>-<arch>.tar.gz，且一个包只含一个架构
+    outputs = {arch: args.output or f"{safe_filename(args.name)}-{safe_filename(args.version)}-"
+                                    f"{safe_filename(arch)}.tar.gz"
+               for arch in arches}
 
     values_path = resolve_values_path(args.chart_path, args.values)
 
     workdir = tempfile.mkdtemp(prefix="kc-addon-")
     try:
-        # 最终包的顶层目录必须是 <name>/...
-        top_dir = os.path.join(workdir, args.name)
-        arch_dir = os.path.join(top_dir, args.version, args.arch)
-        os.makedirs(arch_dir, exist_ok=True)
-
-        # 1) 打 charts.tgz
-        charts_tgz = os.path.join(arch_dir, "charts.tgz")
-        tar_dir_as_tgz(args.chart_path, charts_tgz)
-
-        # 2) 渲染镜像列表
-        images = render_images(args.chart_path, values_path, args.helm_arg)
-
-        # 3) 写 images.list（可选，但很有用）
-        images_list_path = os.path.join(arch_dir, "images.list")
-        with open(images_list_path, "w", encoding="utf-8") as f:
-            f.write("\n".join(images))
-
-        # 4) 先 pull 再 save
-        if images and args.pull:
-            pull_images(images, args.image_tool, args.parallel, args.ctr_namespace, args.ignore_pull_errors)
-
-        # 5) 保存 images.tar.gz（注意：manifest 示例是 tar.gz）
-        images_targz = os.path.join(arch_dir, "images.tar.gz")
-        if images:
-            tmp_tar = os.path.join(arch_dir, "images.tar")
-            save_images_to_tar(images, args.image_tool, tmp_tar, args.ctr_namespace)
-            gzip_file(tmp_tar, images_targz)
-            os.remove(tmp_tar)
-        else:
-            # 没镜像也可以不生成 images.tar.gz（按需）
-            pass
+        # 最终包的顶层目录必须是 <name>/...；每个架构单独一个包
+        top_dirs = {arch: os.path.join(workdir, "pkg", arch, args.name) for arch in arches}
+        arch_dirs = {arch: os.path.join(top_dirs[arch], args.version, arch) for arch in arches}
+        for arch_dir in arch_dirs.values():
+            os.makedirs(arch_dir, exist_ok=True)
+
+        charts_name, images_name = ARTIFACT_NAMES[args.compression]
+        images: Optional[List[str]] = None
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            # 1) 打 charts.tgz，和渲染/pull 互不依赖（都只读 chart 目录），放后台并行；
+            #    chart 与架构无关，多架构时只打一次
+            charts_tgz = os.path.join(arch_dirs[arches[0]], charts_name)
+            charts_fut = ex.submit(tar_dir_as_tgz, args.chart_path, charts_tgz, args.compression)
+
+            for arch in arches:
+                arch_dir = arch_dirs[arch]
+                save_dir = os.path.join(workdir, "images", arch)
+                os.makedirs(save_dir, exist_ok=True)
+                # 多架构时按 linux/<arch> 拉取导出；架构之间串行，docker 同一 tag 只能指向一个架构，
+                # 所以每个架构的 save 都紧跟在该架构的 pull 之后
+                platform = f"linux/{arch}" if args.multi_arch else None
+
+                # 2) + 4) 边渲染镜像列表边 pull/save：解析出一个镜像就开始拉，拉完立即单独导出；
+                #    镜像列表与架构无关，只渲染一次
+                source = images if images is not None else iter_images(
+                    args.chart_path, values_path, args.helm_arg,
+                    args.helm_cache_dir if args.helm_cache else None, args.helm_cache_max_mb * 1024 * 1024)
+                images, image_tars = pull_and_save_images(
+                    source, args.image_tool, args.parallel, args.ctr_namespace,
+                    args.pull, args.ignore_pull_errors, save_dir, platform)
+
+                # 3) 写 images.list（可选，但很有用）
+                images_list_path = os.path.join(arch_dir, "images.list")
+                with open(images_list_path, "w", encoding="utf-8") as f:
+                    f.write("\n".join(images))
+
+                # 5) 合并并直接压缩成 images.tar.gz（注意：manifest 示例是 tar.gz）
+                if image_tars:
+                    merge_image_tars(image_tars, os.path.join(arch_dir, images_name), args.compression)
+                else:
+                    # 没镜像也可以不生成 images.tar.gz（按需）
+                    pass
+
+            charts_fut.result()
+
+        # chart 与架构无关，其他架构的包直接复用同一个 charts.tgz（硬链接，不重复打包）
+        for arch in arches[1:]:
+            dst = os.path.join(arch_dirs[arch], charts_name)
+            try:
+                os.link(charts_tgz, dst)
+            except OSError:
+                # 不支持硬链接时复制
+                fast_copy(charts_tgz, dst)
 
         # 6) 生成 manifest.json（在 arch_dir 下）
         #    按你的 calico 示例：只列 charts.tgz 和 images.tar.gz
-        manifest_files = ["charts.tgz"]
-        if os.path.isfile(images_targz):
-            manifest_files.append("images.tar.gz")
-        write_manifest(arch_dir, args.version, args.arch, manifest_files)
+        for arch in arches:
+            manifest_files = [charts_name]
+            if os.path.isfile(os.path.join(arch_dirs[arch], images_name)):
+                manifest_files.append(images_name)
+            write_manifest(arch_dirs[arch], args.version, arch, manifest_files, args.digest_algo)
 
         # 7) 打最终资源包（顶层是 <name>/，绝对不能是 '.'）
-        create_final_tarball(args.output, top_dir)
+        for arch in arches:
+            create_final_tarball(outputs[arch], top_dirs[arch])
 
-        print("resource package generated:", args.output)
+        for arch in arches:
+            print("resource package generated:", outputs[arch])
         print("values used for rendering:", values_path if values_path else "(none)")
         print("images (%d):" % len(images))
         for img in images:
             print("  ", img)
 
-        print("\npackage layout (top-level):")
-        print(f"  {args.name}/{args.version}/{args.arch}/charts.tgz")
-        if os.path.isfile(images_targz):
-            print(f"  {args.name}/{args.version}/{args.arch}/images.tar.gz")
-        print(f"  {args.name}/{args.version}/{args.arch}/manifest.json")
+        for arch in arches:
+            print(f"\npackage layout (top-level) of {outputs[arch]}:" if len(arches) > 1
+                  else "\npackage layout (top-level):")
+            print(f"  {args.name}/{args.version}/{arch}/{charts_name}")
+            if os.path.isfile(os.path.join(arch_dirs[arch], images_name)):
+                print(f"  {args.name}/{args.version}/{arch}/{images_name}")
+            print(f"  {args.name}/{args.version}/{arch}/manifest.json")
 
     finally:
         shutil.rmtree(workdir, ignore_errors=True)